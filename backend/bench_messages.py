@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import base64
+import timeit
+
+import messages
+
+# Typical payload sizes: a 200-400 word story, and a 16:9 Imagen PNG
+# (~1-1.5 MB) which grows by a third once base64 encoded
+STORY_SIZES = {"story 2KB": 2_000, "story 8KB": 8_000}
+IMAGE_SIZES = {"image 500KB": 500_000, "image 1.5MB": 1_500_000}
+
+
+def make_image(size: int) -> dict:
+    return {
+        "keyframe": 1,
+        "prompt": "Cinematic opening scene: a dragon circles the castle. Photorealistic, dramatic lighting",
+        "base64": base64.b64encode(os.urandom(size)).decode("utf-8"),
+        "format": "png"
+    }
+
+
+def legacy_image_frame(response_text: str) -> list:
+    """The previous path: parse the whole response text, then re-encode each image."""
+    json_start = response_text.find("{")
+    json_end = response_text.rfind("}") + 1
+    json_data = json.loads(response_text[json_start:json_end])
+    return [json.dumps({"type": "image_generated", "data": image}) for image in json_data["images"]]
+
+
+def bench(label: str, func, number: int) -> float:
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print(f"  {label:<32} {seconds * 1000:9.3f} ms")
+    return seconds
+
+
+def main():
+    print(f"Fast JSON backend: {'orjson' if messages.USE_FAST_JSON else 'json (stdlib)'}\n")
+
+    print("Constant frames")
+    bench("json.dumps turn_complete", lambda: json.dumps({
+        "type": "turn_complete", "turn_complete": True, "interrupted": False
+    }), 100_000)
+    bench("pre-encoded turn_complete", lambda: messages.TURN_COMPLETE, 100_000)
+
+    for label, size in STORY_SIZES.items():
+        story = ("Once upon a time, a dragon guarded the castle. " * (size // 48 + 1))[:size]
+        print(f"\n{label}")
+        bench("json.dumps", lambda: json.dumps({"type": "story_complete", "data": story}), 10_000)
+        bench("messages.story_complete", lambda: messages.story_complete(story), 10_000)
+
+    for label, size in IMAGE_SIZES.items():
+        image = make_image(size)
+        result = {"success": True, "keyframes_generated": 1, "images": [image]}
+        response_text = "Story text...✅ Generated keyframes.\n\n" + json.dumps(result, indent=2)
+        print(f"\n{label} ({len(image['base64']) / 1e6:.1f} MB base64)")
+        bench("legacy loads + dumps", lambda: legacy_image_frame(response_text), 20)
+        bench("json.dumps structured", lambda: json.dumps({"type": "image_generated", "data": image}), 20)
+        bench("messages.image_generated", lambda: messages.image_generated(image), 20)
+
+        # The fast path must produce the same message
+        assert json.loads(messages.image_generated(image)) == {"type": "image_generated", "data": image}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+
+from loop_health import assert_loop_not_blocked
+
+# test_websocket.py is a manual script that needs a running server
+collect_ignore = ["test_websocket.py"]
+
+
+@pytest.fixture
+def no_loop_blocking():
+    """
+    Run a coroutine on a fresh event loop and fail the test if it blocks the loop.
+
+    Usage:
+
+        def test_request(no_loop_blocking):
+            result = no_loop_blocking(make_request(), threshold_seconds=0.1)
+    """
+    def run(coro, threshold_seconds: float = 0.1):
+        async def guarded():
+            async with assert_loop_not_blocked(threshold_seconds):
+                return await coro
+        return asyncio.run(guarded())
+    return run
@@ -0,0 +1,216 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopBlockedError(AssertionError):
+    """Raised by `assert_loop_not_blocked` when the event loop was held too long."""
+
+
+@dataclass
+class BlockedCall:
+    """A period during which the event loop did not run any other callback."""
+    duration: float
+    stack: str
+
+
+class LoopLagMonitor:
+    """
+    Samples event-loop lag: how late a timer fires compared to when it was due.
+
+    A healthy loop shows lag of a millisecond or two. Sustained lag means
+    something is running synchronous work on the loop and every WebSocket
+    on the worker (including pings) is stalled for that long.
+    """
+
+    def __init__(self, interval_seconds: float = 0.5, window: int = 120):
+        """
+        Args:
+            interval_seconds: Delay between samples
+            window: Number of recent samples kept for the statistics
+        """
+        self._interval_seconds = interval_seconds
+        self._samples: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval_seconds
+            await asyncio.sleep(self._interval_seconds)
+            lag = max(0.0, loop.time() - expected)
+            self._samples.append(lag)
+
+    def start(self) -> None:
+        """Start sampling on the running loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, object]:
+        """Return lag statistics in milliseconds over the recent window."""
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0, "last_ms": 0.0, "mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        return {
+            "samples": len(samples),
+            "last_ms": self._samples[-1] * 1000,
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p99_ms": p99 * 1000,
+            "max_ms": samples[-1] * 1000,
+        }
+
+
+class BlockingCallDetector:
+    """
+    Watchdog that reports callbacks holding the event loop past a threshold.
+
+    A heartbeat task on the loop updates a timestamp; a daemon thread checks
+    it and, when the heartbeat goes stale, captures the stack of the loop
+    thread so the blocking call can be identified. Intended for debugging
+    and tests, since capturing stacks is not free.
+    """
+
+    def __init__(
+        self,
+        threshold_seconds: float = 0.1,
+        on_block: Optional[Callable[[BlockedCall], None]] = None,
+    ):
+        """
+        Args:
+            threshold_seconds: How long a callback may hold the loop before it is reported
+            on_block: Called from the watchdog thread for each detected block;
+                defaults to logging the stack trace
+        """
+        self._threshold_seconds = threshold_seconds
+        self._check_interval = threshold_seconds / 2
+        self._on_block = on_block or self._log_block
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._current: Optional[BlockedCall] = None
+        self._lock = threading.Lock()
+        self.blocks: List[BlockedCall] = []
+
+    @staticmethod
+    def _log_block(block: BlockedCall) -> None:
+        logger.warning(f"Event loop blocked for over {block.duration * 1000:.0f} ms in:\n{block.stack}")
+
+    def _stale_for(self) -> float:
+        # The heartbeat normally lags by up to one check interval
+        return time.monotonic() - self._heartbeat - self._check_interval
+
+    async def _beat(self) -> None:
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self._check_interval)
+
+    def _watch(self) -> None:
+        while not self._stop_event.wait(self._check_interval):
+            stale = self._stale_for()
+            with self._lock:
+                if stale <= self._threshold_seconds:
+                    self._current = None
+                elif self._current is not None:
+                    self._current.duration = stale
+                else:
+                    frame = sys._current_frames().get(self._loop_thread_id)
+                    stack = "".join(traceback.format_stack(frame)) if frame else "<stack unavailable>"
+                    self._current = BlockedCall(duration=stale, stack=stack)
+                    self.blocks.append(self._current)
+                    self._on_block(self._current)
+
+    def start(self) -> None:
+        """Start watching the running loop. Must be called from the loop thread."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-block-detector", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Stop watching and join the watchdog thread."""
+        if self._task is None:
+            return
+        # Catch a block that ended after the watchdog's last check
+        stale = self._stale_for()
+        with self._lock:
+            if stale > self._threshold_seconds and self._current is None:
+                block = BlockedCall(duration=stale, stack="<ended before stack could be captured>")
+                self.blocks.append(block)
+                self._on_block(block)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stop_event.set()
+        # Joining can wait up to one check interval; don't hold the loop for it
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    def stats(self) -> Dict[str, object]:
+        """Return a summary of detected blocks."""
+        with self._lock:
+            return {
+                "threshold_ms": self._threshold_seconds * 1000,
+                "blocks": len(self.blocks),
+                "max_block_ms": max((b.duration for b in self.blocks), default=0.0) * 1000,
+            }
+
+
+@asynccontextmanager
+async def assert_loop_not_blocked(threshold_seconds: float = 0.1):
+    """
+    Fail if anything holds the event loop longer than the threshold.
+
+    Use in tests around a request to keep blocking calls off the hot path:
+
+        async with assert_loop_not_blocked(0.05):
+            await websocket_roundtrip()
+
+    Args:
+        threshold_seconds: Maximum time any single callback may hold the loop
+
+    Raises:
+        LoopBlockedError: If a block was detected, with the captured stack traces
+    """
+    detector = BlockingCallDetector(threshold_seconds, on_block=lambda block: None)
+    detector.start()
+    try:
+        yield detector
+    finally:
+        await detector.stop()
+
+    if detector.blocks:
+        details = "\n".join(
+            f"Blocked for {block.duration * 1000:.0f} ms:\n{block.stack}" for block in detector.blocks
+        )
+        raise LoopBlockedError(
+            f"Event loop blocked {len(detector.blocks)} time(s) over {threshold_seconds * 1000:.0f} ms\n{details}"
+        )
@@ -14,7 +14,11 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+import messages
 from story_agent.workflow_agent import create_story_workflow_agent
+from story_agent.image_agent import ImageGenerationAgent
+from story_cache import StoryCache, KeywordPopularity, CacheWarmer
+from loop_health import LoopLagMonitor, BlockingCallDetector
 
 # Load environment variables
 load_dotenv()
@@ -25,6 +29,24 @@ logger = logging.getLogger(__name__)
 
 # Application constants
 APP_NAME = "storygen_app"
+WARMER_USER_ID = "cache_warmer"
+
+# Admission and cache warmer configuration
+MAX_CONCURRENT_WORKFLOWS = int(os.getenv("MAX_CONCURRENT_WORKFLOWS", "4"))
+STORY_CACHE_MAX_ENTRIES = int(os.getenv("STORY_CACHE_MAX_ENTRIES", "32"))
+STORY_CACHE_MAX_BYTES = int(os.getenv("STORY_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+STORY_CACHE_TTL_SECONDS = float(os.getenv("STORY_CACHE_TTL_SECONDS", "3600"))
+CACHE_WARMER_ENABLED = os.getenv("CACHE_WARMER_ENABLED", "TRUE").upper() == "TRUE"
+CACHE_WARMER_TOP_K = int(os.getenv("CACHE_WARMER_TOP_K", "5"))
+CACHE_WARMER_MAX_CONCURRENCY = int(os.getenv("CACHE_WARMER_MAX_CONCURRENCY", "1"))
+CACHE_WARMER_RESERVED_SLOTS = int(os.getenv("CACHE_WARMER_RESERVED_SLOTS", "1"))
+CACHE_WARMER_MAX_PER_CYCLE = int(os.getenv("CACHE_WARMER_MAX_PER_CYCLE", "2"))
+CACHE_WARMER_INTERVAL_SECONDS = float(os.getenv("CACHE_WARMER_INTERVAL_SECONDS", "30"))
+
+# Event-loop health configuration
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+LOOP_BLOCK_DEBUG = os.getenv("LOOP_BLOCK_DEBUG", "FALSE").upper() == "TRUE"
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
 
 # Initialize FastAPI app
 app = FastAPI(title="StoryGen Backend", description="ADK-powered story generation backend")
@@ -42,7 +64,93 @@ app.add_middleware(
 session_service = InMemorySessionService()
 workflow_agent = create_story_workflow_agent()
 
+# Live workflows are admitted through these slots; the cache warmer never takes one
+workflow_slots = asyncio.Semaphore(MAX_CONCURRENT_WORKFLOWS)
+live_workflows_in_flight = 0
+
+# Only complete runs are cached; with an image agent that means every keyframe rendered
+story_cache = StoryCache(
+    max_entries=STORY_CACHE_MAX_ENTRIES,
+    max_bytes=STORY_CACHE_MAX_BYTES,
+    ttl_seconds=STORY_CACHE_TTL_SECONDS,
+    require_images=any(isinstance(agent, ImageGenerationAgent) for agent in workflow_agent.sub_agents),
+)
+
 async def run_story_workflow(user_id: str, keywords: str):
+    """
+    Run the story generation workflow for live traffic, holding an admission slot
+    
+    Args:
+        user_id: Unique identifier for the user session
+        keywords: Keywords to generate story from
+        
+    Returns:
+        The workflow result and the generated keyframe images
+    """
+    global live_workflows_in_flight
+    live_workflows_in_flight += 1
+    try:
+        async with workflow_slots:
+            return await execute_story_workflow(user_id, keywords)
+    finally:
+        live_workflows_in_flight -= 1
+
+async def warm_story(keywords: str) -> tuple[str, list]:
+    """
+    Generate a story for the cache warmer outside of the live admission slots
+    
+    Args:
+        keywords: Normalized keywords to pre-generate
+        
+    Returns:
+        The full workflow response text and the generated keyframe images
+    """
+    result, images = await execute_story_workflow(WARMER_USER_ID, keywords)
+    return "".join(part.text for part in result.parts if part.text), images
+
+cache_warmer = CacheWarmer(
+    cache=story_cache,
+    popularity=KeywordPopularity(),
+    generate=warm_story,
+    # Warm only while at least CACHE_WARMER_RESERVED_SLOTS admission slots are free
+    is_idle=lambda: live_workflows_in_flight <= MAX_CONCURRENT_WORKFLOWS - CACHE_WARMER_RESERVED_SLOTS,
+    top_k=CACHE_WARMER_TOP_K,
+    max_concurrency=CACHE_WARMER_MAX_CONCURRENCY,
+    max_per_cycle=CACHE_WARMER_MAX_PER_CYCLE,
+    interval_seconds=CACHE_WARMER_INTERVAL_SECONDS,
+)
+
+# Event-loop lag sampler, plus a stack-capturing block detector in debug mode
+loop_lag_monitor = LoopLagMonitor(interval_seconds=LOOP_LAG_INTERVAL_SECONDS)
+blocking_call_detector = BlockingCallDetector(threshold_seconds=LOOP_BLOCK_THRESHOLD_MS / 1000) if LOOP_BLOCK_DEBUG else None
+
+@app.on_event("startup")
+async def start_loop_health():
+    """Start event-loop health monitoring"""
+    loop_lag_monitor.start()
+    if blocking_call_detector:
+        blocking_call_detector.start()
+        logger.info(f"Blocking call detector enabled (threshold {LOOP_BLOCK_THRESHOLD_MS:.0f} ms)")
+
+@app.on_event("shutdown")
+async def stop_loop_health():
+    """Stop event-loop health monitoring"""
+    await loop_lag_monitor.stop()
+    if blocking_call_detector:
+        await blocking_call_detector.stop()
+
+@app.on_event("startup")
+async def start_cache_warmer():
+    """Start the background cache warmer"""
+    if CACHE_WARMER_ENABLED:
+        cache_warmer.start()
+
+@app.on_event("shutdown")
+async def stop_cache_warmer():
+    """Stop the background cache warmer"""
+    await cache_warmer.stop()
+
+async def execute_story_workflow(user_id: str, keywords: str):
     """
     Run the story generation workflow for the given keywords
     
@@ -51,7 +159,7 @@ async def run_story_workflow(user_id: str, keywords: str):
         keywords: Keywords to generate story from
         
     Returns:
-        The workflow result
+        The workflow result and the generated keyframe images
     """
     try:
         # Create a Runner with the workflow agent
@@ -81,7 +189,12 @@ async def run_story_workflow(user_id: str, keywords: str):
         
         # Collect all events and get the final result
         result_text = ""
+        images = []
         async for event in events:
+            # Keyframes arrive as structured state, not embedded in the text
+            state_delta = event.actions.state_delta if event.actions else None
+            if state_delta and "image_generation_result" in state_delta:
+                images = state_delta["image_generation_result"].get("images", [])
             if event.content and event.content.parts:
                 for part in event.content.parts:
                     if part.text:
@@ -94,7 +207,7 @@ async def run_story_workflow(user_id: str, keywords: str):
         )
 
         logger.info(f"Workflow completed for user {user_id}")
-        return result
+        return result, images
         
     except Exception as e:
         logger.error(f"Failed to run workflow for user {user_id}: {e}")
@@ -114,10 +227,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
 
     try:
         # Send connection confirmation
-        await websocket.send_text(json.dumps({
-            "type": "connected",
-            "message": "Connected to StoryGen backend"
-        }))
+        await websocket.send_text(messages.CONNECTED)
 
         while True:
             # Receive message from client
@@ -130,79 +240,52 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
             if message_type == "generate_story":
                 try:
                     # Send processing notification
-                    await websocket.send_text(json.dumps({
-                        "type": "processing",
-                        "message": "Generating story and images..."
-                    }))
+                    await websocket.send_text(messages.PROCESSING)
                     
-                    # Run the workflow
-                    result = await run_story_workflow(user_id, data)
-                    logger.info(f"Workflow result type: {type(result)}")
-                    logger.info(f"Workflow result parts: {len(result.parts) if result.parts else 0}")
+                    cache_warmer.record_request(data)
+                    cached = story_cache.get(data)
                     
-                    # Extract content from result
-                    response_text = ""
-                    for part in result.parts:
-                        if part.text:
-                            response_text += part.text
+                    if cached is not None:
+                        logger.info(f"Serving cached story for user {user_id}")
+                        response_text, images = cached.response_text, cached.images
+                    else:
+                        # Run the workflow
+                        result, images = await run_story_workflow(user_id, data)
+                        
+                        # Extract content from result
+                        response_text = ""
+                        for part in result.parts:
+                            if part.text:
+                                response_text += part.text
+                        
+                        story_cache.put(data, response_text, images)
                     
-                    logger.info(f"Extracted response text length: {len(response_text)}")
-                    logger.info(f"Response text preview: {response_text[:200]}...")
+                    # Lazy formatting: the preview is only built when debug logging is on
+                    logger.debug("Response text preview: %.200s...", response_text)
                     
                     # Always send the story first, regardless of images
                     if response_text.strip():
                         logger.info(f"Sending story to frontend: {len(response_text)} chars")
-                        await websocket.send_text(json.dumps({
-                            "type": "story_complete",
-                            "data": response_text.strip()
-                        }))
+                        await websocket.send_text(messages.story_complete(response_text.strip()))
                     else:
                         logger.warning("Empty response text from workflow")
-                        await websocket.send_text(json.dumps({
-                            "type": "error",
-                            "message": "No story was generated"
-                        }))
+                        await websocket.send_text(messages.error("No story was generated"))
                     
-                    # Check for image data separately
-                    if "images" in response_text and "base64" in response_text:
-                        logger.info("Found image data in response, parsing...")
-                        try:
-                            # Extract JSON from the response
-                            json_start = response_text.find("{")
-                            json_end = response_text.rfind("}") + 1
-                            if json_start >= 0 and json_end > json_start:
-                                json_data = json.loads(response_text[json_start:json_end])
-                                
-                                # Send images
-                                if "images" in json_data:
-                                    for image in json_data["images"]:
-                                        await websocket.send_text(json.dumps({
-                                            "type": "image_generated",
-                                            "data": image
-                                        }))
-                                        logger.info(f"Sent image keyframe {image.get('keyframe', 'unknown')}")
-                        except json.JSONDecodeError as e:
-                            logger.error(f"Failed to parse image JSON: {e}")
-                    else:
-                        logger.info("No image data found in response")
+                    # Send images
+                    for image in images:
+                        await websocket.send_text(messages.image_generated(image))
+                        logger.info(f"Sent image keyframe {image.get('keyframe', 'unknown')}")
                     
                     # Send completion notification
-                    await websocket.send_text(json.dumps({
-                        "type": "turn_complete",
-                        "turn_complete": True,
-                        "interrupted": False
-                    }))
+                    await websocket.send_text(messages.TURN_COMPLETE)
                     
                 except Exception as e:
                     logger.error(f"Error generating story for user {user_id}: {e}")
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": f"Story generation failed: {str(e)}"
-                    }))
+                    await websocket.send_text(messages.error(f"Story generation failed: {str(e)}"))
                 
             elif message_type == "ping":
                 # Handle ping/keepalive messages
-                await websocket.send_text(json.dumps({"type": "pong"}))
+                await websocket.send_text(messages.PONG)
                 
             else:
                 logger.warning(f"Unknown message type: {message_type}")
@@ -212,10 +295,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
     except Exception as e:
         logger.error(f"WebSocket error for user {user_id}: {e}")
         try:
-            await websocket.send_text(json.dumps({
-                "type": "error",
-                "message": f"Server error: {str(e)}"
-            }))
+            await websocket.send_text(messages.error(f"Server error: {str(e)}"))
         except:
             pass
     finally:
@@ -226,6 +306,19 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "storygen-backend"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Story cache and cache warmer statistics"""
+    return cache_warmer.stats()
+
+@app.get("/loop/stats")
+async def loop_stats():
+    """Event-loop lag and blocking call statistics"""
+    return {
+        "lag": loop_lag_monitor.stats(),
+        "blocking_calls": blocking_call_detector.stats() if blocking_call_detector else None,
+    }
+
 @app.get("/")
 async def root():
     """Root endpoint"""
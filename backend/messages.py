@@ -0,0 +1,88 @@
+import os
+import json
+from typing import Any, Dict
+
+# orjson is optional; it is several times faster than json for large frames
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+USE_FAST_JSON = orjson is not None and os.getenv("FAST_JSON", "TRUE").upper() == "TRUE"
+
+
+def dumps(obj: Any) -> str:
+    """
+    Serialize an outbound message to compact JSON text.
+
+    Args:
+        obj: JSON-serializable message
+
+    Returns:
+        JSON string ready for `websocket.send_text`
+    """
+    if USE_FAST_JSON:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+# Constant frames, encoded once at import
+PONG = dumps({"type": "pong"})
+PROCESSING = dumps({
+    "type": "processing",
+    "message": "Generating story and images..."
+})
+TURN_COMPLETE = dumps({
+    "type": "turn_complete",
+    "turn_complete": True,
+    "interrupted": False
+})
+CONNECTED = dumps({
+    "type": "connected",
+    "message": "Connected to StoryGen backend"
+})
+
+
+def story_complete(story: str) -> str:
+    """Build a `story_complete` frame."""
+    return dumps({"type": "story_complete", "data": story})
+
+
+def error(message: str) -> str:
+    """Build an `error` frame."""
+    return dumps({"type": "error", "message": message})
+
+
+def image_generated(image: Dict[str, Any]) -> str:
+    """
+    Build an `image_generated` frame for one keyframe.
+
+    The base64 payload is spliced into the frame as-is instead of being run
+    through the JSON encoder: base64 output only contains characters that
+    need no escaping, and at several megabytes it dominates encoding cost.
+
+    Precondition for the splice: `image["base64"]` is real base64 output
+    (no quotes, backslashes or control characters). Payloads that are not
+    ASCII or contain a quote or backslash fall back to the JSON encoder;
+    control characters are not checked, as there is no fast test for them.
+
+    Args:
+        image: Keyframe dict from the image agent (keyframe, prompt, base64, format)
+
+    Returns:
+        JSON string ready for `websocket.send_text`
+    """
+    payload = image.get("base64")
+    if not (isinstance(payload, str) and payload.isascii() and '"' not in payload and "\\" not in payload):
+        return dumps({"type": "image_generated", "data": image})
+
+    metadata = dumps({key: value for key, value in image.items() if key != "base64"})
+    separator = "," if len(metadata) > 2 else ""
+    return "".join((
+        '{"type":"image_generated","data":',
+        metadata[:-1],
+        separator,
+        '"base64":"',
+        payload,
+        '"}}',
+    ))
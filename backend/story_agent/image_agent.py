@@ -1,11 +1,14 @@
 import os
-import json
 import re
+import base64
+import asyncio
+import tempfile
 import vertexai
 from vertexai.preview.vision_models import ImageGenerationModel
 from google.adk.agents import BaseAgent
 from google.adk.agents.invocation_context import InvocationContext
 from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
 from google.genai.types import Content, Part
 from typing import AsyncGenerator
 
@@ -76,31 +79,15 @@ class ImageGenerationAgent(BaseAgent):
             generated_images = []
             for i, prompt in enumerate(image_prompts):
                 try:
-                    images = self._model.generate_images(
-                        prompt=prompt,
-                        number_of_images=1,
-                        negative_prompt="cartoon, sketch, drawing, low quality, blurry",
-                        aspect_ratio="16:9"
-                    )
-                    
-                    # Convert to base64 (similar to existing tool)
-                    import tempfile
-                    import base64
+                    # Imagen, temp-file I/O and base64 are blocking; keep them off the event loop
+                    img_base64 = await asyncio.to_thread(self._render_keyframe, prompt)
+                    generated_images.append({
+                        "keyframe": i + 1,
+                        "prompt": prompt,
+                        "base64": img_base64,
+                        "format": "png"
+                    })
                     
-                    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_file:
-                        images[0].save(location=temp_file.name)
-                        
-                        with open(temp_file.name, "rb") as img_file:
-                            img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-                            generated_images.append({
-                                "keyframe": i + 1,
-                                "prompt": prompt,
-                                "base64": img_base64,
-                                "format": "png"
-                            })
-                        
-                        os.unlink(temp_file.name)
-                        
                 except Exception as e:
                     generated_images.append({
                         "keyframe": i + 1,
@@ -116,17 +103,20 @@ class ImageGenerationAgent(BaseAgent):
                 "images": generated_images
             }
             
-            # Store in session state for other agents to access
-            ctx.session.state["image_generation_result"] = result
-            
-            response_text = f"✅ Successfully generated {len(generated_images)} visual keyframes for the story.\n\n"
-            response_text += json.dumps(result, indent=2)
+            # Publish the result through the event's state delta only; the server
+            # forwards the images from it without embedding megabytes of base64
+            # in the response text
+            response_text = f"✅ Successfully generated {len(generated_images)} visual keyframes for the story."
             
             response_content = Content(
                 role="model",
                 parts=[Part.from_text(text=response_text)]
             )
-            yield Event(author=self.name, content=response_content)
+            yield Event(
+                author=self.name,
+                content=response_content,
+                actions=EventActions(state_delta={"image_generation_result": result})
+            )
             
         except Exception as e:
             error_message = f"❌ Image generation failed: {str(e)}"
@@ -136,6 +126,34 @@ class ImageGenerationAgent(BaseAgent):
             )
             yield Event(author=self.name, content=error_content)
     
+    def _render_keyframe(self, prompt: str) -> str:
+        """
+        Generate one image and return it base64 encoded. Blocking; run in a thread.
+        
+        Args:
+            prompt: Image generation prompt
+            
+        Returns:
+            Base64-encoded PNG data
+        """
+        images = self._model.generate_images(
+            prompt=prompt,
+            number_of_images=1,
+            negative_prompt="cartoon, sketch, drawing, low quality, blurry",
+            aspect_ratio="16:9"
+        )
+        
+        # Convert to base64 (similar to existing tool)
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_file:
+            images[0].save(location=temp_file.name)
+            
+            with open(temp_file.name, "rb") as img_file:
+                img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
+            
+            os.unlink(temp_file.name)
+        
+        return img_base64
+    
     def _extract_image_prompts(self, story_text: str) -> list[str]:
         """
         Extract 4 key visual moments from the story text to create image prompts.
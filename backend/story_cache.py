@@ -0,0 +1,375 @@
+import time
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Where a cache entry came from
+SOURCE_LIVE = "live"
+SOURCE_WARMER = "warmer"
+
+
+def normalize_keywords(keywords: str) -> str:
+    """
+    Normalize a keyword string so equivalent requests share a cache key.
+
+    Keywords are comma-separated phrases. Phrase order and spacing do not
+    matter, but word order within a phrase does: "Red dragon,  old castle"
+    and "old castle, red dragon" both map to "old castle, red dragon",
+    while "old dragon, red castle" stays distinct.
+
+    Args:
+        keywords: Raw keyword string from the client
+
+    Returns:
+        Canonical keyword string (lowercase, de-duplicated, sorted phrases)
+    """
+    phrases = (" ".join(phrase.split()) for phrase in keywords.lower().split(","))
+    return ", ".join(sorted({phrase for phrase in phrases if phrase}))
+
+
+def is_cacheable(response_text: str, images: List[Dict[str, Any]], require_images: bool) -> bool:
+    """
+    Decide whether a workflow response is complete enough to cache.
+
+    A run where Imagen failed (keyframes carrying an "error", or no images at
+    all when the workflow has an image agent) must not be cached, otherwise a
+    transient failure is served to every user until the entry expires.
+
+    Args:
+        response_text: Full text returned by the workflow
+        images: Keyframe images produced by the workflow
+        require_images: Whether the workflow includes an image agent
+
+    Returns:
+        True if the response may be cached
+    """
+    if not response_text.strip():
+        return False
+    if require_images and not images:
+        return False
+    return all(isinstance(image.get("base64"), str) and "error" not in image for image in images)
+
+
+def entry_size(response_text: str, images: List[Dict[str, Any]]) -> int:
+    """Approximate memory held by a cached response: its text plus base64 payloads."""
+    return len(response_text) + sum(len(image.get("base64") or "") for image in images)
+
+
+@dataclass
+class CacheEntry:
+    """A cached workflow response (story text plus structured keyframe images)."""
+    response_text: str
+    images: List[Dict[str, Any]]
+    source: str
+    created_at: float
+    size: int
+
+
+class StoryCache:
+    """
+    In-memory LRU cache of workflow responses keyed by normalized keywords.
+
+    Hits are counted separately for entries produced by the background
+    warmer ("warm") and entries produced by live traffic ("cold") so the
+    value of pre-generation can be measured.
+
+    An entry with four keyframes holds several megabytes of base64, so the
+    cache is bounded by total size as well as entry count.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 32,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl_seconds: float = 3600.0,
+        require_images: bool = False,
+    ):
+        """
+        Args:
+            max_entries: Maximum number of cached keyword sets
+            max_bytes: Maximum total size of cached text and base64 payloads
+            ttl_seconds: Lifetime of a cache entry
+            require_images: Refuse responses without keyframe images
+                (set when the workflow includes an image agent)
+        """
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._ttl_seconds = ttl_seconds
+        self._require_images = require_images
+        self.warm_hits = 0
+        self.cold_hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at > self._ttl_seconds:
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    def contains(self, keywords: str) -> bool:
+        """Check for a fresh entry without touching hit/miss counters."""
+        return self._lookup(normalize_keywords(keywords)) is not None
+
+    def get(self, keywords: str) -> Optional[CacheEntry]:
+        """
+        Look up a cached response and record the hit or miss.
+
+        Args:
+            keywords: Raw or normalized keyword string
+
+        Returns:
+            The cached entry, or None on a miss
+        """
+        key = normalize_keywords(keywords)
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if entry.source == SOURCE_WARMER:
+            self.warm_hits += 1
+        else:
+            self.cold_hits += 1
+        return entry
+
+    def put(
+        self,
+        keywords: str,
+        response_text: str,
+        images: Optional[List[Dict[str, Any]]] = None,
+        source: str = SOURCE_LIVE,
+    ) -> bool:
+        """
+        Store a complete workflow response, evicting least recently used entries if full.
+
+        Args:
+            keywords: Raw or normalized keyword string
+            response_text: Full text returned by the workflow
+            images: Keyframe images produced by the workflow
+            source: SOURCE_LIVE or SOURCE_WARMER
+
+        Returns:
+            True if the response was stored, False if it was incomplete or
+            larger than the whole byte budget
+        """
+        images = images or []
+        if not is_cacheable(response_text, images, self._require_images):
+            return False
+        size = entry_size(response_text, images)
+        if size > self._max_bytes:
+            return False
+
+        key = normalize_keywords(keywords)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(
+            response_text=response_text, images=images, source=source, created_at=time.monotonic(), size=size
+        )
+        self._bytes += size
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            self._remove(next(iter(self._entries)))
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        """Return hit-rate statistics for the cache."""
+        lookups = self.warm_hits + self.cold_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "warm_entries": sum(1 for e in self._entries.values() if e.source == SOURCE_WARMER),
+            "lookups": lookups,
+            "warm_hits": self.warm_hits,
+            "cold_hits": self.cold_hits,
+            "misses": self.misses,
+            "hit_rate": (self.warm_hits + self.cold_hits) / lookups if lookups else 0.0,
+            "warm_hit_rate": self.warm_hits / lookups if lookups else 0.0,
+            "cold_hit_rate": self.cold_hits / lookups if lookups else 0.0,
+        }
+
+
+class KeywordPopularity:
+    """
+    Exponentially decayed request counts per normalized keyword set.
+
+    Counts are halved every `half_life_seconds` so yesterday's trend does
+    not crowd out today's.
+    """
+
+    def __init__(self, half_life_seconds: float = 3600.0, max_tracked: int = 1000):
+        self._counts: Counter = Counter()
+        self._half_life_seconds = half_life_seconds
+        self._max_tracked = max_tracked
+        self._last_decay = time.monotonic()
+
+    def _decay(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_decay
+        if elapsed < self._half_life_seconds:
+            return
+        factor = 0.5 ** (elapsed / self._half_life_seconds)
+        self._counts = Counter({k: v * factor for k, v in self._counts.items() if v * factor >= 0.01})
+        self._last_decay = now
+
+    def record(self, keywords: str) -> None:
+        """Record one request for the given keywords."""
+        key = normalize_keywords(keywords)
+        if not key:
+            return
+        self._decay()
+        if key not in self._counts and len(self._counts) >= self._max_tracked:
+            # Drop the long tail rather than growing without bound; prune
+            # before counting so the key being recorded is never the one lost
+            self._counts = Counter(dict(self._counts.most_common(self._max_tracked // 2)))
+        self._counts[key] += 1
+
+    def top(self, k: int) -> List[str]:
+        """Return the k most popular normalized keyword sets."""
+        self._decay()
+        return [key for key, _ in self._counts.most_common(k)]
+
+
+class CacheWarmer:
+    """
+    Background task that pre-generates stories for popular keyword sets.
+
+    The warmer only runs while live traffic leaves spare capacity (as
+    reported by `is_idle`) and uses its own concurrency budget, so it never
+    holds one of the live admission slots in `run_story_workflow`.
+    """
+
+    def __init__(
+        self,
+        cache: StoryCache,
+        popularity: KeywordPopularity,
+        generate: Callable[[str], Awaitable[Tuple[str, List[Dict[str, Any]]]]],
+        is_idle: Callable[[], bool],
+        top_k: int = 5,
+        max_concurrency: int = 1,
+        max_per_cycle: int = 2,
+        interval_seconds: float = 30.0,
+    ):
+        """
+        Args:
+            cache: Cache to populate
+            popularity: Keyword popularity tracker fed by live traffic
+            generate: Coroutine that runs the workflow and returns the response text and images
+            is_idle: Returns True when live traffic leaves enough admission slots free
+            top_k: Number of most popular keyword sets to keep warm
+            max_concurrency: Maximum concurrent warmer generations
+            max_per_cycle: Maximum generations started per warming cycle
+            interval_seconds: Delay between warming cycles
+        """
+        self._cache = cache
+        self._popularity = popularity
+        self._generate = generate
+        self._is_idle = is_idle
+        self._top_k = top_k
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._max_per_cycle = max_per_cycle
+        self._interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._in_progress: set = set()
+        self.generated = 0
+        self.failed = 0
+        self.skipped_busy = 0
+
+    def record_request(self, keywords: str) -> None:
+        """Record a live `generate_story` request for popularity tracking."""
+        self._popularity.record(keywords)
+
+    def candidates(self) -> List[str]:
+        """Return popular keyword sets that are neither cached nor being warmed."""
+        return [
+            key for key in self._popularity.top(self._top_k)
+            if key not in self._in_progress and not self._cache.contains(key)
+        ]
+
+    async def _warm_one(self, keywords: str) -> None:
+        try:
+            async with self._slots:
+                # Live traffic may have arrived while we waited for a slot
+                if not self._is_idle():
+                    self.skipped_busy += 1
+                    return
+                response_text, images = await self._generate(keywords)
+                if self._cache.put(keywords, response_text, images, source=SOURCE_WARMER):
+                    self.generated += 1
+                    logger.info(f"Cache warmer pre-generated story for '{keywords}'")
+                else:
+                    # Left uncached so the next cycle retries it
+                    self.failed += 1
+                    logger.warning(f"Cache warmer got an incomplete result for '{keywords}'")
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Cache warmer failed for '{keywords}': {e}")
+        finally:
+            self._in_progress.discard(keywords)
+
+    async def run_once(self) -> int:
+        """
+        Run a single warming cycle.
+
+        Returns:
+            Number of keyword sets generated and cached in this cycle
+        """
+        if not self._is_idle():
+            self.skipped_busy += 1
+            return 0
+
+        batch = self.candidates()[:self._max_per_cycle]
+        self._in_progress.update(batch)
+        generated_before = self.generated
+        await asyncio.gather(*(self._warm_one(keywords) for keywords in batch))
+        return self.generated - generated_before
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval_seconds)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Cache warmer cycle failed: {e}")
+
+    def start(self) -> None:
+        """Start the background warming loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+            logger.info("Cache warmer started")
+
+    async def stop(self) -> None:
+        """Cancel the background warming loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Cache warmer stopped")
+
+    def stats(self) -> Dict[str, object]:
+        """Return warmer and cache statistics."""
+        return {
+            "cache": self._cache.stats(),
+            "warmer": {
+                "running": self._task is not None and not self._task.done(),
+                "generated": self.generated,
+                "failed": self.failed,
+                "skipped_busy": self.skipped_busy,
+                "in_progress": len(self._in_progress),
+                "top_keywords": self._popularity.top(self._top_k),
+            },
+        }
@@ -0,0 +1,151 @@
+import json
+import time
+import asyncio
+
+import pytest
+
+from loop_health import BlockingCallDetector, LoopBlockedError, LoopLagMonitor, assert_loop_not_blocked
+
+
+def block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def test_synchronous_sleep_fails_with_stack():
+    async def scenario():
+        async with assert_loop_not_blocked(threshold_seconds=0.05):
+            await asyncio.sleep(0.01)
+            block_the_loop(0.3)
+            await asyncio.sleep(0.01)
+
+    with pytest.raises(LoopBlockedError) as excinfo:
+        asyncio.run(scenario())
+    assert "block_the_loop" in str(excinfo.value)
+
+
+def test_awaited_sleeps_pass():
+    async def scenario():
+        async with assert_loop_not_blocked(threshold_seconds=0.05) as detector:
+            for _ in range(10):
+                await asyncio.sleep(0.02)
+        return detector
+
+    detector = asyncio.run(scenario())
+    assert detector.blocks == []
+    assert detector.stats()["blocks"] == 0
+
+
+def test_detector_reports_to_callback():
+    reported = []
+
+    async def scenario():
+        detector = BlockingCallDetector(threshold_seconds=0.05, on_block=reported.append)
+        detector.start()
+        await asyncio.sleep(0.01)
+        block_the_loop(0.3)
+        await asyncio.sleep(0.01)
+        await detector.stop()
+        return detector
+
+    detector = asyncio.run(scenario())
+    assert len(reported) == 1
+    assert detector.stats()["max_block_ms"] >= 100
+
+
+def test_lag_monitor_reports_injected_lag():
+    async def scenario():
+        monitor = LoopLagMonitor(interval_seconds=0.02)
+        assert monitor.stats()["samples"] == 0
+        monitor.start()
+        await asyncio.sleep(0.05)
+        block_the_loop(0.2)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["samples"] > 0
+    assert stats["max_ms"] >= 150
+    assert stats["p99_ms"] >= 150
+
+
+def test_lag_monitor_max_covers_recent_window_only():
+    async def scenario():
+        monitor = LoopLagMonitor(interval_seconds=0.01, window=5)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        block_the_loop(0.2)
+        # Enough quiet samples to push the spike out of the window
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["samples"] == 5
+    assert stats["max_ms"] < 100
+
+
+def test_no_loop_blocking_fixture_fails_on_block(no_loop_blocking):
+    async def blocking_request():
+        block_the_loop(0.3)
+
+    with pytest.raises(LoopBlockedError):
+        no_loop_blocking(blocking_request(), threshold_seconds=0.05)
+    assert no_loop_blocking(asyncio.sleep(0.05, result="done"), threshold_seconds=0.05) == "done"
+
+
+def test_websocket_roundtrip_does_not_block(monkeypatch, no_loop_blocking):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("google.adk")
+    from google.genai.types import Content, Part
+
+    import main
+    from story_cache import StoryCache
+
+    image = {"keyframe": 1, "prompt": "a dragon", "base64": "iVBORw0KGgo=" * 1000, "format": "png"}
+
+    async def fake_run_story_workflow(user_id, keywords):
+        await asyncio.sleep(0.01)
+        return Content(role="model", parts=[Part.from_text(text="A dragon guarded the castle.")]), [image]
+
+    monkeypatch.setattr(main, "run_story_workflow", fake_run_story_workflow)
+    monkeypatch.setattr(main, "story_cache", StoryCache())
+
+    async def roundtrip():
+        incoming = asyncio.Queue()
+        sent = []
+
+        async def receive():
+            return await incoming.get()
+
+        async def send(message):
+            sent.append(message)
+            if message.get("text") and json.loads(message["text"])["type"] == "turn_complete":
+                await incoming.put({"type": "websocket.disconnect", "code": 1000})
+
+        await incoming.put({"type": "websocket.connect"})
+        await incoming.put({
+            "type": "websocket.receive",
+            "text": json.dumps({"type": "generate_story", "data": "dragon castle"}),
+        })
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": "/ws/test_user",
+            "raw_path": b"/ws/test_user",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+            "subprotocols": [],
+        }
+        await main.app(scope, receive, send)
+        return [json.loads(m["text"]) for m in sent if m["type"] == "websocket.send"]
+
+    frames = no_loop_blocking(roundtrip(), threshold_seconds=0.1)
+    assert [frame["type"] for frame in frames] == [
+        "connected", "processing", "story_complete", "image_generated", "turn_complete"
+    ]
+    assert frames[3]["data"] == image
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import messages
+
+IMAGE = {"keyframe": 1, "prompt": 'A "dragon" \\ castle ✨', "base64": "iVBORw0KGgo+/=" * 100, "format": "png"}
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def json_backend(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+        monkeypatch.setattr(messages, "orjson", __import__("orjson"))
+        monkeypatch.setattr(messages, "USE_FAST_JSON", True)
+    else:
+        monkeypatch.setattr(messages, "USE_FAST_JSON", False)
+    return request.param
+
+
+def test_dumps_roundtrips(json_backend):
+    message = {"type": "story_complete", "data": 'Once "upon" a time ✨\n', "n": 1, "ok": True}
+    encoded = messages.dumps(message)
+    assert isinstance(encoded, str)
+    assert json.loads(encoded) == message
+
+
+@pytest.mark.parametrize("image", [
+    IMAGE,
+    {"base64": "AAAA"},
+    {"keyframe": 2, "prompt": "missing payload", "format": "png"},
+    {"keyframe": 3, "base64": None},
+    {"keyframe": 4, "prompt": "failed", "error": "quota exceeded"},
+], ids=["metadata", "empty-metadata", "missing-base64", "none-base64", "error"])
+def test_image_generated_matches_json(json_backend, image):
+    assert json.loads(messages.image_generated(image)) == {"type": "image_generated", "data": image}
+
+
+@pytest.mark.parametrize("payload", ['AA"A', "AA\\A", "AAé"])
+def test_image_generated_falls_back_for_unsafe_payload(json_backend, payload):
+    image = {"keyframe": 1, "base64": payload}
+    assert json.loads(messages.image_generated(image)) == {"type": "image_generated", "data": image}
+
+
+def test_constant_frames():
+    assert json.loads(messages.PONG) == {"type": "pong"}
+    assert json.loads(messages.PROCESSING) == {"type": "processing", "message": "Generating story and images..."}
+    assert json.loads(messages.TURN_COMPLETE) == {"type": "turn_complete", "turn_complete": True, "interrupted": False}
+    assert json.loads(messages.CONNECTED) == {"type": "connected", "message": "Connected to StoryGen backend"}
+
+
+def test_builders():
+    assert json.loads(messages.story_complete("A story")) == {"type": "story_complete", "data": "A story"}
+    assert json.loads(messages.error("Boom")) == {"type": "error", "message": "Boom"}
@@ -0,0 +1,277 @@
+import asyncio
+
+import pytest
+
+import story_cache
+from story_cache import (
+    SOURCE_WARMER,
+    CacheWarmer,
+    KeywordPopularity,
+    StoryCache,
+    is_cacheable,
+    normalize_keywords,
+)
+
+GOOD_IMAGE = {"keyframe": 1, "prompt": "a dragon", "base64": "iVBORw0KGgo=", "format": "png"}
+FAILED_IMAGE = {"keyframe": 1, "prompt": "a dragon", "error": "Failed to generate image: 429 quota exceeded"}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(story_cache.time, "monotonic", fake)
+    return fake
+
+
+def make_warmer(cache, responses, idle=lambda: True, **kwargs):
+    """Build a warmer whose generate returns canned (text, images) per keyword set."""
+    calls = []
+
+    async def generate(keywords):
+        calls.append(keywords)
+        return responses.get(keywords, (f"story about {keywords}", [GOOD_IMAGE]))
+
+    warmer = CacheWarmer(cache, KeywordPopularity(), generate, idle, **kwargs)
+    return warmer, calls
+
+
+def test_normalize_keywords():
+    assert normalize_keywords("Dragon,  castle , magic") == "castle, dragon, magic"
+    assert normalize_keywords("magic, castle, dragon, dragon") == "castle, dragon, magic"
+    assert normalize_keywords("  Red   Dragon ") == "red dragon"
+    assert normalize_keywords("  , , ") == ""
+
+
+def test_normalize_keywords_keeps_phrase_word_order():
+    # Reordered phrases share a key
+    assert normalize_keywords("red dragon, old castle") == normalize_keywords("Old Castle,red dragon")
+    # Reordered words inside phrases do not
+    assert normalize_keywords("red dragon, old castle") != normalize_keywords("old dragon, red castle")
+    assert normalize_keywords("not a happy ending") != normalize_keywords("a happy, not ending")
+
+
+def test_is_cacheable():
+    assert is_cacheable("story", [GOOD_IMAGE], require_images=True)
+    assert is_cacheable("story", [], require_images=False)
+    assert not is_cacheable("   ", [GOOD_IMAGE], require_images=True)
+    assert not is_cacheable("story", [GOOD_IMAGE, FAILED_IMAGE], require_images=True)
+    assert not is_cacheable("story", [{"keyframe": 1, "base64": "AA==", "error": "x"}], require_images=False)
+    assert not is_cacheable("story ❌ Image generation failed: quota", [], require_images=True)
+
+
+def test_cache_counts_warm_cold_and_misses():
+    cache = StoryCache()
+    assert cache.get("dragon, castle") is None
+    cache.put("dragon, castle", "live story", [GOOD_IMAGE])
+    cache.put("robot", "warm story", [GOOD_IMAGE], source=SOURCE_WARMER)
+
+    assert cache.get("Castle, dragon").response_text == "live story"
+    entry = cache.get("robot")
+    assert entry.response_text == "warm story"
+    assert entry.images == [GOOD_IMAGE]
+
+    stats = cache.stats()
+    assert (stats["warm_hits"], stats["cold_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["warm_entries"] == 1
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_contains_does_not_count():
+    cache = StoryCache()
+    cache.put("dragon", "story")
+    assert cache.contains("dragon")
+    assert not cache.contains("robot")
+    assert cache.stats()["lookups"] == 0
+
+
+def test_cache_evicts_least_recently_used():
+    cache = StoryCache(max_entries=2)
+    cache.put("a", "story a")
+    cache.put("b", "story b")
+    cache.get("a")
+    cache.put("c", "story c")
+    assert cache.contains("a")
+    assert not cache.contains("b")
+    assert cache.contains("c")
+
+
+def test_cache_evicts_by_byte_budget():
+    cache = StoryCache(max_bytes=250)
+    cache.put("a", "s", [{"keyframe": 1, "base64": "A" * 99}])
+    cache.put("b", "s", [{"keyframe": 1, "base64": "B" * 99}])
+    cache.get("a")
+    cache.put("c", "s", [{"keyframe": 1, "base64": "C" * 99}])
+    assert cache.contains("a")
+    assert not cache.contains("b")
+    assert cache.contains("c")
+    assert cache.stats()["bytes"] == 200
+
+
+def test_cache_replacing_entry_updates_bytes():
+    cache = StoryCache()
+    cache.put("a", "s", [{"keyframe": 1, "base64": "A" * 99}])
+    cache.put("a", "s", [{"keyframe": 1, "base64": "A" * 9}])
+    assert cache.stats()["bytes"] == 10
+
+
+def test_cache_rejects_entry_larger_than_budget():
+    cache = StoryCache(max_bytes=50)
+    cache.put("a", "small story")
+    assert not cache.put("b", "s", [{"keyframe": 1, "base64": "B" * 100}])
+    assert cache.contains("a")
+
+
+def test_cache_expires_entries(clock):
+    cache = StoryCache(ttl_seconds=60)
+    cache.put("dragon", "story")
+    clock.now += 59
+    assert cache.get("dragon") is not None
+    clock.now += 2
+    assert cache.get("dragon") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes"] == 0
+
+
+def test_cache_rejects_failed_images():
+    cache = StoryCache(require_images=True)
+    assert not cache.put("dragon", "story", [FAILED_IMAGE])
+    assert not cache.put("dragon", "story ❌ Image generation failed: quota", [])
+    assert cache.get("dragon") is None
+    assert cache.put("dragon", "story", [GOOD_IMAGE])
+
+
+def test_popularity_ranks_and_decays(clock):
+    popularity = KeywordPopularity(half_life_seconds=100)
+    for _ in range(3):
+        popularity.record("dragon, castle")
+    popularity.record("robot")
+    assert popularity.top(2) == ["castle, dragon", "robot"]
+
+    # Old trend decays below fresh traffic
+    clock.now += 300
+    for _ in range(2):
+        popularity.record("ocean")
+    assert popularity.top(1) == ["ocean"]
+
+
+def test_popularity_prune_keeps_new_key():
+    popularity = KeywordPopularity(max_tracked=4)
+    for key in ["a", "b", "c", "d"]:
+        popularity.record(key)
+        popularity.record(key)
+    popularity.record("e")
+    top = popularity.top(10)
+    assert "e" in top
+    assert len(top) <= 4
+
+
+def test_popularity_ignores_empty_keywords():
+    popularity = KeywordPopularity()
+    popularity.record(" , ")
+    popularity.record("")
+    assert popularity.top(5) == []
+
+
+def test_warmer_fills_top_candidates():
+    cache = StoryCache(require_images=True)
+    warmer, calls = make_warmer(cache, {}, top_k=2)
+    for keywords in ["dragon", "Dragon ", "robot", "ocean"]:
+        warmer.record_request(keywords)
+    cache.put("robot", "live story", [GOOD_IMAGE])
+
+    assert warmer.candidates() == ["dragon"]
+    assert asyncio.run(warmer.run_once()) == 1
+    assert calls == ["dragon"]
+    assert cache.get("dragon").response_text == "story about dragon"
+    assert cache.stats()["warm_hits"] == 1
+    assert warmer.generated == 1
+
+
+def test_warmer_respects_max_per_cycle():
+    cache = StoryCache()
+    warmer, calls = make_warmer(cache, {}, top_k=5, max_per_cycle=2)
+    for keywords in ["a", "b", "c", "d"]:
+        warmer.record_request(keywords)
+    assert asyncio.run(warmer.run_once()) == 2
+    assert len(calls) == 2
+
+
+def test_warmer_skips_while_busy():
+    cache = StoryCache()
+    warmer, calls = make_warmer(cache, {}, idle=lambda: False)
+    warmer.record_request("dragon")
+    assert asyncio.run(warmer.run_once()) == 0
+    assert calls == []
+    assert warmer.skipped_busy == 1
+
+
+def test_warmer_skips_when_traffic_arrives_mid_cycle():
+    cache = StoryCache()
+    idle = iter([True, False])
+    warmer, calls = make_warmer(cache, {}, idle=lambda: next(idle))
+    warmer.record_request("dragon")
+    assert asyncio.run(warmer.run_once()) == 0
+    assert calls == []
+    assert warmer.skipped_busy == 1
+    # Released so the next cycle can retry it
+    assert warmer.candidates() == ["dragon"]
+
+
+def test_warmer_dedupes_in_progress_keys():
+    cache = StoryCache()
+    release = None
+
+    async def generate(keywords):
+        await release.wait()
+        return f"story about {keywords}", []
+
+    warmer = CacheWarmer(cache, KeywordPopularity(), generate, lambda: True)
+    warmer.record_request("dragon")
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        cycle = asyncio.create_task(warmer.run_once())
+        await asyncio.sleep(0)
+        assert warmer.candidates() == []
+        assert await warmer.run_once() == 0
+        release.set()
+        await cycle
+
+    asyncio.run(scenario())
+    assert warmer.generated == 1
+    assert warmer.stats()["warmer"]["in_progress"] == 0
+
+
+def test_warmer_does_not_cache_failed_images():
+    cache = StoryCache(require_images=True)
+    warmer, calls = make_warmer(cache, {"dragon": ("story", [FAILED_IMAGE])})
+    warmer.record_request("dragon")
+
+    assert asyncio.run(warmer.run_once()) == 0
+    assert cache.get("dragon") is None
+    assert warmer.failed == 1
+    assert warmer.generated == 0
+    # Still a candidate, so the next cycle retries
+    assert warmer.candidates() == ["dragon"]
+
+
+def test_warmer_counts_generate_exceptions():
+    cache = StoryCache()
+
+    async def generate(keywords):
+        raise RuntimeError("vertex unavailable")
+
+    warmer = CacheWarmer(cache, KeywordPopularity(), generate, lambda: True)
+    warmer.record_request("dragon")
+    asyncio.run(warmer.run_once())
+    assert warmer.failed == 1
+    assert warmer.candidates() == ["dragon"]